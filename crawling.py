@@ -1,7 +1,15 @@
-import wikipedia
-import json
+import asyncio
+import aiohttp
+import orjson
+import multiprocessing
+import os
 import re
+import sqlite3
 import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from email.utils import parsedate_to_datetime
+from itertools import chain
 from pathlib import Path
 import logging
 
@@ -16,59 +24,182 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+USER_AGENT = "crawling_wikipedia/1.0 (https://github.com/PamanGie/crawling_wikipedia)"
+
+# Pola regex untuk pembersihan teks, di-compile sekali saat import.
+# Tetap pakai modul re bawaan: modul regex dan re2 lebih lambat untuk teks
+# Wikipedia yang banyak match referensinya (overhead per match di binding Python).
+# Referensi, citation needed, edit tags dan URL dihapus dalam satu pass.
+# URL berhenti di '[' supaya tag setelahnya tidak ikut tertelan sebagian
+_RE_CLEAN_ALL = re.compile(
+    r'\[\d+\]'
+    r'|\[citation needed\]'
+    r'|\[edit\]'
+    r'|https?://[^\s\[]+'
+)
+
+# Header section level 2: baris yang diawali '== ' dan diakhiri ' =='. Baris header
+# di-capture supaya split menghasilkan [intro, header1, isi1, header2, isi2, ...].
+# Diawali literal '\n' supaya re bisa langsung mencari prefix-nya
+_RE_SECTION = re.compile(r'\n(== (?:[^\n]*? )?==)(?=\n|\Z)')
+
+def _parse_retry_after(headers):
+    """Baca header Retry-After (detik atau HTTP-date), None jika tidak ada"""
+    value = headers.get("Retry-After") if headers else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+class MediaWikiError(Exception):
+    """Error dari MediaWiki API yang dikirim di body JSON, biasanya dengan HTTP 200"""
+    def __init__(self, code, info):
+        super().__init__(f"MediaWiki API error {code}: {info}")
+        self.code = code
+
+class RateLimiter:
+    """Menjaga jarak minimal antar request ke satu host"""
+    def __init__(self, requests_per_second):
+        self.default_interval = 1 / requests_per_second
+        self.min_interval = self.default_interval
+        self.last_request_time = 0.0
+        self.resume_at = 0.0  # semua request ditahan sampai waktu ini (monotonic)
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Tunggu sampai request berikutnya boleh dikirim"""
+        async with self._lock:
+            # Dihitung ulang setiap kali bangun, karena pause() bisa dipanggil sementara menunggu
+            while True:
+                wait = max(self.last_request_time + self.min_interval, self.resume_at) - time.monotonic()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.last_request_time = time.monotonic()
+    
+    def pause(self, seconds):
+        """Tahan semua request selama beberapa detik, misalnya setelah respon 429"""
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+    
+    def update(self, headers):
+        """Sesuaikan interval dari header X-RateLimit-* server"""
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            self.min_interval = self.default_interval
+            return
+        
+        # Reset bisa berupa epoch timestamp atau jumlah detik
+        now = time.time()
+        if reset > now:
+            reset -= now
+        
+        # Sebar sisa kuota secara merata sampai window di-reset
+        self.min_interval = max(self.default_interval, reset / max(remaining, 1))
+
+class PageCache:
+    """Cache hasil API per topik di SQLite supaya crawl ulang tidak fetch lagi"""
+    def __init__(self, path, expire):
+        self.expire = expire
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages "
+                "(topic TEXT PRIMARY KEY, page BLOB NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS failed_topics "
+                "(topic TEXT PRIMARY KEY, failed_at REAL NOT NULL)"
+            )
+    
+    @staticmethod
+    def _key(topic):
+        return ' '.join(topic.lower().split())
+    
+    def _fresh(self, table, column, topic):
+        return self._conn.execute(
+            f"SELECT * FROM {table} WHERE topic = ? AND {column} > ?",
+            (self._key(topic), time.time() - self.expire),
+        ).fetchone()
+    
+    def get(self, topic):
+        """Ambil page yang masih berlaku, None jika tidak ada atau kadaluarsa"""
+        row = self._fresh("pages", "fetched_at", topic)
+        return orjson.loads(row[1]) if row else None
+    
+    def set(self, topic, page):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?)",
+                (self._key(topic), orjson.dumps(page), time.time()),
+            )
+    
+    def is_failed(self, topic):
+        """Cek apakah topik ini sebelumnya gagal permanen"""
+        return self._fresh("failed_topics", "failed_at", topic) is not None
+    
+    def mark_failed(self, topic):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO failed_topics VALUES (?, ?)",
+                (self._key(topic), time.time()),
+            )
+    
+    def close(self):
+        self._conn.close()
+
 class WikipediaArticleCrawler:
     def __init__(self):
-        wikipedia.set_lang("en")
+        self.lang = "en"
+        self.api_url = f"https://{self.lang}.wikipedia.org/w/api.php"
         self.retry_count = 3
-        self.delay = 2  # seconds between requests
-        
-    def clean_text(self, text):
-        """Membersihkan teks dari karakter yang tidak diinginkan"""
-        # Hapus referensi Wikipedia [1], [2], dst
-        text = re.sub(r'\[\d+\]', '', text)
-        
-        # Hapus multiple spaces
-        text = re.sub(r'\s+', ' ', text)
+        self.backoff_base = 2  # seconds before the first retry, doubled on each failure
+        self.backoff_max = 60  # upper bound for a single retry wait, including Retry-After
+        self.requests_per_second = 10  # default rate when the server sends no limits
+        self.max_concurrency = 64  # jumlah artikel yang diproses bersamaan
+        self.max_workers = os.cpu_count()  # process untuk parsing dan cleaning
+        self.write_batch_size = 64  # artikel per write ke file output
+        self.progress_interval = 5.0  # seconds between progress file updates
+        self.cache_file = 'wiki_cache.sqlite3'
+        self.cache_expire = 7 * 24 * 60 * 60  # seconds before a cached page is refetched
+        self.timeout = 30  # seconds per HTTP request
+        self.keepalive_timeout = 60  # seconds an idle pooled connection stays open
         
-        # Hapus multiple newlines
-        text = re.sub(r'\n\s*\n', '\n', text)
-        
-        # Hapus spasi di awal dan akhir setiap baris
-        text = '\n'.join(line.strip() for line in text.split('\n'))
-        
-        return text.strip()
+    def _normalize_whitespace(self, text):
+        """Merapikan spasi dan baris kosong"""
+        # Semua whitespace (spasi, tab, newline) dijadikan satu spasi
+        return ' '.join(text.split())
     
     def clean_section(self, section_text):
         """Membersihkan konten section"""
-        # Hapus citation needed tags
-        text = re.sub(r'\[citation needed\]', '', section_text)
-        
-        # Hapus edit tags
-        text = re.sub(r'\[edit\]', '', text)
-        
-        # Hapus referensi
-        text = re.sub(r'\[\d+\]', '', text)
+        # Hapus citation needed, edit tags, referensi dan URL sekaligus.
+        # Semua pola diawali '[' atau 'http', jadi regex dilewati jika keduanya tidak ada
+        text = section_text
+        if '[' in text or 'http' in text:
+            text = _RE_CLEAN_ALL.sub('', text)
         
-        # Hapus URL
-        text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-        
-        # Bersihkan teks
-        text = self.clean_text(text)
-        
-        return text
+        # Rapikan whitespace
+        return self._normalize_whitespace(text)
 
     def _format_article(self, title, sections):
         """Format artikel dengan format yang lebih clean"""
-        # Mulai dengan title
-        lines = [f"Title: {title}"]
-        
-        # Tambahkan setiap section
-        for section in sections:
-            if section["title"] and section["content"]:
-                lines.append(f"Section: {section['title']}")
-                lines.append(section["content"])
-        
-        return '\n'.join(lines)
+        # Title diikuti setiap section, satu operand join per section
+        return '\n'.join(chain(
+            [f"Title: {title}"],
+            (
+                f"Section: {section['title']}\n{section['content']}"
+                for section in sections
+                if section["title"] and section["content"]
+            ),
+        ))
 
     def _verify_article_quality(self, article):
         """Verifikasi kualitas artikel"""
@@ -77,80 +208,152 @@ class WikipediaArticleCrawler:
             
         completion = article['completion']
         
-        # Cek panjang minimal
-        word_count = len(completion.split())
-        if word_count < 100:
-            return False, f"Article too short ({word_count} words)"
-        
-        # Cek jumlah section minimal
+        # Cek jumlah section minimal (paling murah, jadi dicek duluan)
         section_count = completion.count('Section:')
         if section_count < 2:
             return False, f"Too few sections ({section_count})"
         
-        # Cek rasio kata unik
-        words = completion.lower().split()
-        unique_words = len(set(words))
-        word_ratio = unique_words / len(words)
+        # Cek panjang minimal
+        words = completion.split()
+        word_count = len(words)
+        if word_count <= 100:
+            return False, f"Article too short ({word_count} words)"
+        
+        # Cek rasio kata unik, lowercase per kata tanpa menyalin seluruh teks
+        unique_words = len(set(map(str.lower, words)))
+        word_ratio = unique_words / word_count
         if word_ratio < 0.3:
             return False, f"Low word diversity ({word_ratio:.2f})"
         
         return True, f"Passed all checks ({word_count} words, {section_count} sections)"
 
-    def get_article_structure(self, topic):
+    async def _api_get(self, session, limiter, params):
+        """Kirim request GET ke MediaWiki API dan kembalikan hasil JSON"""
+        params = {**params, "format": "json", "formatversion": 2}
+        await limiter.acquire()
+        async with session.get(self.api_url, params=params) as response:
+            limiter.update(response.headers)
+            response.raise_for_status()
+            return await response.json()
+
+    async def _search_page(self, session, limiter, topic):
+        """Cari artikel teratas untuk sebuah topik sekaligus ambil plain-text extract-nya"""
+        data = await self._api_get(session, limiter, {
+            "action": "query",
+            "generator": "search",
+            "gsrsearch": topic,
+            "gsrlimit": 1,
+            "prop": "extracts|pageprops",
+            "ppprop": "disambiguation",
+            "explaintext": 1,
+            "exlimit": 1,
+            "redirects": 1,
+        })
+        # maxlag, ratelimited, error database dll. bukan berarti hasil pencarian kosong
+        if "error" in data:
+            error = data["error"]
+            raise MediaWikiError(error.get("code"), error.get("info"))
+        
+        pages = data.get("query", {}).get("pages", [])
+        return pages[0] if pages else None
+
+    def _retry_wait(self, error, attempt, limiter):
+        """Hitung waktu tunggu sebelum retry, None jika error permanen"""
+        wait = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        if isinstance(error, aiohttp.ClientResponseError):
+            # 4xx selain 429 tidak akan berhasil jika diulang
+            if error.status != 429 and error.status < 500:
+                return None
+            retry_after = _parse_retry_after(error.headers)
+            if retry_after is not None:
+                wait = min(self.backoff_max, retry_after)
+            # Server minta pelan-pelan: tahan semua task, bukan hanya task ini
+            if error.status == 429 or retry_after is not None:
+                limiter.pause(wait)
+        elif isinstance(error, MediaWikiError):
+            if error.code in ("maxlag", "ratelimited"):
+                limiter.pause(wait)
+        elif not isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+            return None
+        
+        return wait
+
+    def _build_article(self, topic, page_title, content):
+        """Parse, bersihkan dan verifikasi artikel dari plain-text extract"""
+        sections = self._parse_sections(content)
+        if not sections:
+            return None, "No valid sections found"
+        
+        article = {
+            "prompt": f"Write a detailed article about {topic}",
+            "completion": self._format_article(page_title, sections)
+        }
+        
+        # Verify article quality
+        is_valid, message = self._verify_article_quality(article)
+        if not is_valid:
+            return None, f"Article quality check failed: {message}"
+        
+        return article, message
+
+    async def get_article_structure(self, session, limiter, topic, executor=None, cache=None):
         """Get article with improved error handling"""
         for attempt in range(self.retry_count):
             try:
+                if cache is not None and cache.is_failed(topic):
+                    logger.warning(f"Skipping {topic}: no results in a previous run")
+                    return None
+                
                 logger.info(f"Processing article: {topic} (Attempt {attempt + 1}/{self.retry_count})")
                 
-                # Cari artikel
-                search_results = wikipedia.search(topic, results=1)
-                if not search_results:
-                    logger.warning(f"No results found for: {topic}")
-                    return None
+                page = cache.get(topic) if cache is not None else None
+                if page is not None:
+                    logger.info(f"Loaded {topic} from cache")
+                else:
+                    # Cari artikel dan ambil isinya dalam satu request
+                    page = await self._search_page(session, limiter, topic)
+                    if page is None:
+                        logger.warning(f"No results found for: {topic}")
+                        if cache is not None:
+                            cache.mark_failed(topic)
+                        return None
+                    if cache is not None:
+                        cache.set(topic, page)
                 
-                page_title = search_results[0]
+                page_title = page["title"]
                 logger.info(f"Found article: {page_title}")
                 
-                try:
-                    page = wikipedia.page(page_title, auto_suggest=False)
-                except wikipedia.DisambiguationError as e:
-                    logger.info(f"Disambiguation found for {topic}, trying first option: {e.options[0]}")
-                    try:
-                        page = wikipedia.page(e.options[0], auto_suggest=False)
-                    except Exception as inner_e:
-                        logger.error(f"Failed to get disambiguation page for {topic}: {inner_e}")
-                        continue
-                except wikipedia.PageError:
-                    logger.error(f"Page not found for: {topic}")
+                if "disambiguation" in page.get("pageprops", {}):
+                    logger.error(f"Disambiguation page found for {topic}: {page_title}")
                     return None
                 
-                time.sleep(self.delay)
-                
-                content = page.content
-                sections = self._parse_sections(content)
+                # Parsing dan cleaning adalah kerja CPU, jalankan di worker process
+                content = page.get("extract", "")
+                if executor is None:
+                    article, message = self._build_article(topic, page_title, content)
+                else:
+                    loop = asyncio.get_running_loop()
+                    article, message = await loop.run_in_executor(
+                        executor, self._build_article, topic, page_title, content
+                    )
                 
-                if not sections:
-                    logger.warning(f"No valid sections found for: {topic}")
+                if article is None:
+                    logger.warning(f"Article rejected for {topic}: {message}")
                     return None
-                    
-                article = {
-                    "prompt": f"Write a detailed article about {topic}",
-                    "completion": self._format_article(page_title, sections)
-                }
-                
-                # Verify article quality
-                is_valid, message = self._verify_article_quality(article)
-                if not is_valid:
-                    logger.warning(f"Article quality check failed for {topic}: {message}")
-                    continue
                 
                 logger.info(f"Successfully processed {topic}: {message}")
                 return article
                     
             except Exception as e:
+                wait = self._retry_wait(e, attempt, limiter)
+                if wait is None:
+                    logger.error(f"Permanent error processing {topic}: {str(e)}")
+                    return None
+                
                 logger.error(f"Error processing {topic} (Attempt {attempt + 1}): {str(e)}")
                 if attempt < self.retry_count - 1:
-                    time.sleep(self.delay)
+                    logger.info(f"Retrying {topic} in {wait:.1f}s")
+                    await asyncio.sleep(wait)
                     continue
                 return None
         
@@ -159,29 +362,19 @@ class WikipediaArticleCrawler:
     def _parse_sections(self, content):
         """Parse sections with improved handling"""
         sections = []
-        current_section = None
-        current_text = ""
-        
-        for line in content.split('\n'):
-            if line.startswith('== ') and line.endswith(' =='):
-                if current_section:
-                    cleaned_text = self.clean_section(current_text)
-                    if cleaned_text:
-                        sections.append({
-                            "title": current_section,
-                            "content": cleaned_text
-                        })
-                
-                current_section = line.strip('= ')
-                current_text = ""
-            else:
-                current_text += line + "\n"
+        # '\n' di depan supaya header di baris pertama juga ikut ter-match
+        parts = _RE_SECTION.split('\n' + content)
         
-        if current_section:
-            cleaned_text = self.clean_section(current_text)
+        # parts[0] adalah teks sebelum section pertama, tidak dipakai
+        for header, text in zip(parts[1::2], parts[2::2]):
+            # Section tanpa judul dibuang, sama seperti sebelumnya
+            title = header.strip('= ')
+            if not title:
+                continue
+            cleaned_text = self.clean_section(text)
             if cleaned_text:
                 sections.append({
-                    "title": current_section,
+                    "title": title,
                     "content": cleaned_text
                 })
         
@@ -189,6 +382,10 @@ class WikipediaArticleCrawler:
 
     def crawl_multiple_articles(self, topics, output_file):
         """Crawl multiple articles with progress tracking"""
+        return asyncio.run(self._crawl_multiple_articles(topics, output_file))
+
+    async def _crawl_multiple_articles(self, topics, output_file):
+        """Fetch artikel secara concurrent, hasil ditulis oleh satu writer"""
         success_count = 0
         failed_count = 0
         failed_topics = []
@@ -198,29 +395,100 @@ class WikipediaArticleCrawler:
         Path(output_file).parent.mkdir(parents=True, exist_ok=True)
         
         def update_progress():
-            with open(progress_file, 'w', encoding='utf-8') as prog:
+            # Tulis ke file sementara lalu rename, jadi file progress selalu utuh
+            tmp_file = progress_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as prog:
                 prog.write(f"Progress: {success_count + failed_count}/{len(topics)}\n")
                 prog.write(f"Successful: {success_count}\n")
                 prog.write(f"Failed: {failed_count}\n")
                 prog.write("\nFailed topics:\n")
                 prog.write('\n'.join(failed_topics))
+            os.replace(tmp_file, progress_file)
+        
+        def flush(f, batch):
+            f.write(b''.join(orjson.dumps(article) + b'\n' for article in batch))
+            f.flush()
+            batch.clear()
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for i, topic in enumerate(topics, 1):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.requests_per_second)
+        results = asyncio.Queue()
+        
+        async def crawl_topic(session, executor, i, topic):
+            async with semaphore:
                 logger.info(f"\nProcessing {i}/{len(topics)}: {topic}")
-                article = self.get_article_structure(topic)
-                
-                if article and len(article['completion'].split()) > 100:
-                    f.write(json.dumps(article, ensure_ascii=False) + '\n')
+                article = await self.get_article_structure(session, limiter, topic, executor, cache)
+            await results.put((topic, article))
+        
+        async def writer(f):
+            # Hanya task ini yang menulis ke file, jadi tidak ada write yang tumpang tindih
+            batch = []
+            last_progress_write = time.monotonic()
+            
+            def record(topic, article):
+                nonlocal success_count, failed_count
+                if article:
+                    batch.append(article)
                     success_count += 1
-                    logger.info(f"[OK] Successfully saved article about {topic}")
+                    logger.info(f"[OK] Successfully processed article about {topic}")
+                    if len(batch) >= self.write_batch_size:
+                        flush(f, batch)
                 else:
                     failed_count += 1
                     failed_topics.append(topic)
                     logger.warning(f"[FAIL] Failed to process {topic}")
-                
+            
+            try:
+                while True:
+                    item = await results.get()
+                    if item is None:
+                        break
+                    record(*item)
+                    
+                    now = time.monotonic()
+                    if now - last_progress_write > self.progress_interval:
+                        update_progress()
+                        last_progress_write = now
+            finally:
+                # Tetap tulis artikel yang sudah selesai walaupun crawl dihentikan
+                while not results.empty():
+                    item = results.get_nowait()
+                    if item is not None:
+                        record(*item)
+                flush(f, batch)
                 update_progress()
         
+        # Worker di-spawn, bukan di-fork: saat pool pertama kali dipakai,
+        # resolver DNS aiohttp sudah menjalankan thread di process ini
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        
+        with closing(PageCache(self.cache_file, self.cache_expire)) as cache, \
+                open(output_file, 'wb') as f:
+            writer_task = asyncio.create_task(writer(f))
+            # Satu session untuk semua topik: koneksi TCP+TLS dipakai ulang (keep-alive)
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.max_concurrency,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            try:
+                async with aiohttp.ClientSession(
+                    connector=connector,
+                    headers={"User-Agent": USER_AGENT},
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                ) as session:
+                    await asyncio.gather(*(
+                        crawl_topic(session, executor, i, topic)
+                        for i, topic in enumerate(topics, 1)
+                    ))
+            finally:
+                # Jangan blok event loop menunggu worker yang masih jalan
+                executor.shutdown(wait=False, cancel_futures=True)
+                await results.put(None)
+                await writer_task
+        
         logger.info("\nCrawling Summary:")
         logger.info(f"Total topics: {len(topics)}")
         logger.info(f"Successfully processed: {success_count}")